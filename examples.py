@@ -1,63 +1,89 @@
+import os
 import time
 import datetime
 import threading
 import queue
-from typing import Any, Generator, NoReturn
+from typing import Any, cast
 import matplotlib.pyplot as plt
 import numpy as np
+import numpy.typing as npt
+from PIL import Image
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.cm import ScalarMappable
+from matplotlib.colorbar import Colorbar
+from matplotlib.image import AxesImage
+from matplotlib.text import Text
+from mlx.hw_usb_evb90640 import HwUsbEvb90640, USB_PID, USB_VID
 
 from mlx90640.alert import Alert
 from mlx90640.driver import MLX90640
-from mlx90640.frame import Frame
+from mlx90640.frame import FRAME_COLS, FRAME_ROWS, Frame
 from mlx90640 import utils
 
 
-def discover_evbs(addresses: list[int]) -> list[MLX90640]:
+def discover_evbs(addresses: list[int], retries: int = 5) -> list[MLX90640]:
     devs: list[MLX90640] = []
-
-    for addr in addresses:
-        for _ in range(5):
-            com = MLX90640.discover(addr)
-            time.sleep(0.2)
-            try:
-                if com is None:
-                    raise Exception(f"No COM found for {hex(addr)}")
-
-                devs.append(MLX90640(com_port=com, i2c_addr=addr))
+    remaining = list(addresses)
+    # Each EVB has its own COM port, list them only once
+    com_ports = HwUsbEvb90640.list_serial_ports(USB_PID, USB_VID)
+
+    delay = 0.2
+    for attempt in range(retries):
+        if attempt > 0:
+            # Back off between passes, never after the last one
+            time.sleep(delay)
+            delay *= 2
+
+        for com in list(com_ports):
+            for addr in remaining:
+                try:
+                    # Keep the instance of the first successful handshake
+                    dev = MLX90640(com_port=com, i2c_addr=addr)
+                except Exception:
+                    continue
+
+                devs.append(dev)
+                remaining.remove(addr)
+                com_ports.remove(com)
                 print(f"Found {hex(addr)} on {com}")
                 break
-            except:
-                pass
-                print(f"No COM found for {hex(addr)}")
-    return devs
 
+        if not remaining or not com_ports:
+            break
 
-def _capture_frame(dev: MLX90640) -> Generator[Frame, Any, NoReturn]:
-    config = dev.config
+    for addr in remaining:
+        print(f"No COM found for {hex(addr)}")
 
-    while True:
-        frame = dev.capture(
-            attempts=config["attempts"],
-            threshold=config["threshold"],
-            outlier_threshold=config["outlier_threshold"],
-        )
+    devs.sort(key=lambda dev: addresses.index(dev.i2c_addr))
+    return devs
+
+
+def _quantize(
+    heatmap: npt.NDArray[np.float32], vmin: float, vmax: float
+) -> npt.NDArray[np.uint8]:
+    """
+    Scale the temperatures between `vmin` and `vmax` to 0-255 for display.
 
-        if frame is None:
-            continue
-        yield frame
+    The colormap has 256 colors, so this loses nothing on screen. Alerts are still
+    evaluated on the float temperatures.
+    """
+    scale = 255.0 / (vmax - vmin) if vmax > vmin else 0.0
+    return np.clip((heatmap - vmin) * scale, 0, 255).astype(np.uint8)
 
 
 def monitoring():
+    # Only PNGs are saved, no window is shown, so no GUI backend is needed
+    plt.switch_backend("Agg")
+
     config = MLX90640.load_config()
     addresses = [sensor["addr"] for sensor in config["sensors"]]
     devs = discover_evbs(addresses)
 
     frames_buffer: dict[int, Frame] = {}
 
-    lock = threading.Lock()
     alert_queue: queue.Queue[tuple[MLX90640, Alert, Frame]] = queue.Queue()
     running = threading.Event()
-    capture_threads: list[threading.Thread] = []
 
     # Add offsets to device
     for dev in devs:
@@ -71,79 +97,140 @@ def monitoring():
                 min_value=0,
                 max_value=38,
                 on_trigger=alert_callback,
-                name=f"{hex(dev.i2c_addr)} alert",
+                name=f"{dev.name} alert",
             )
         )
 
-    def capture_frames(dev: MLX90640):
-        capturer = _capture_frame(dev)
+    def capture_frames():
+        settings = [
+            (dev, dev.config["threshold"], dev.config["outlier_threshold"])
+            for dev in devs
+        ]
+
         while not running.is_set():
-            frame = next(capturer)
-            with lock:
-                frames_buffer[dev.i2c_addr] = frame
+            captured = False
+            # Each EVB buffers up to 4 frames, poll every device once per round
+            for dev, threshold, outlier_threshold in settings:
+                # An error of one sensor must not stop capturing the others
+                try:
+                    frame = dev.capture(
+                        attempts=1,
+                        threshold=threshold,
+                        outlier_threshold=outlier_threshold,
+                    )
+                    if frame is None:
+                        continue
+                    captured = True
+
+                    # Storing an item in a dict is atomic, no lock needed
+                    frames_buffer[dev.i2c_addr] = frame
+                except Exception as e:
+                    print(f"Failed to capture from {dev.name}: {e}")
+
+            if not captured:
+                # No EVB had a frame buffered
+                time.sleep(0.01)
+
+    # Start one thread that captures from all sensors
+    capture_thread = threading.Thread(target=capture_frames, name="Capture thread")
+    capture_thread.start()
+
+    # Build the figure once and reuse it for every saved alert
+    fig = plt.figure(figsize=(4, 3), dpi=100)
+    canvas = cast(FigureCanvasAgg, fig.canvas)
+    ax = fig.add_subplot()
+    im = ax.imshow(
+        np.zeros((FRAME_ROWS, FRAME_COLS), dtype=np.uint8),
+        cmap="coolwarm",
+        vmin=0,
+        vmax=255,
+        interpolation="nearest",
+        origin="lower",
+        aspect="auto",
+    )
+    # The image is quantized, the colorbar shows the temperatures
+    cbar = fig.colorbar(ScalarMappable(cmap="coolwarm"), ax=ax)
+    # Add text below graph
+    text = ax.text(
+        1,
+        1,
+        "",
+        color="white",
+        fontsize=10,
+        bbox=dict(facecolor="black", alpha=0.25, linewidth=0, boxstyle="round"),
+    )
+    # Set title
+    ax.set_title("Heatmap 0x00")
+    ax.set_xlabel("0x00")
+    fig.tight_layout()
+
+    # Encode the PNGs on a separate thread, bursts of alerts don't stall the loop
+    writer_queue: queue.Queue[tuple[str, npt.NDArray[np.uint8]]] = queue.Queue(
+        maxsize=16
+    )
+    os.makedirs("alerts", exist_ok=True)
+
+    def write_images():
+        while True:
+            filename, buffer = writer_queue.get()
+            # A failed write must not stop the thread, the queue would fill up
+            try:
+                Image.fromarray(buffer).save(filename, compress_level=1)
+            except Exception as e:
+                print(f"Failed to save {filename}: {e}")
 
-    # Start a thread for each sensor
-    for dev in devs:
-        thread = threading.Thread(
-            target=capture_frames,
-            name=f"Captrure thread {hex(dev.i2c_addr)}",
-            args=(dev,),
-        )
-        thread.start()
-        capture_threads.append(thread)
+    threading.Thread(
+        target=write_images, name="Image writer thread", daemon=True
+    ).start()
 
     print("Monitoring...")
     while True:
-        dev, alert, frame = alert_queue.get(block=True)
-        print(
-            " ".join(
-                [
-                    f"Alert '{alert.name}' triggered by {alert.last_trigger['offender']}",
-                    f"with value {alert.last_trigger['value']:.2f}",
-                    f"min: {frame.min()}, avg: {frame.avg()}, max: {frame.max()}",
-                    f"({alert.trigger_count} triggers)",
-                ]
+        # Drain a burst of alerts at once, only the latest frame of each device is saved
+        alerts = [alert_queue.get(block=True)]
+        while True:
+            try:
+                alerts.append(alert_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        latest: dict[int, tuple[MLX90640, Frame, tuple[float, float, float]]] = {}
+        for dev, alert, frame in alerts:
+            frame_stats = frame.min_avg_max()
+            frame_min, frame_avg, frame_max = frame_stats
+            print(
+                " ".join(
+                    [
+                        f"Alert '{alert.name}' triggered by {alert.last_trigger['offender']}",
+                        f"with value {alert.last_trigger['value']:.2f}",
+                        f"min: {frame_min}, avg: {frame_avg}, max: {frame_max}",
+                        f"({alert.trigger_count} triggers)",
+                    ]
+                )
             )
-        )
+            latest[dev.i2c_addr] = (dev, frame, frame_stats)
 
-        heatmap = np.array(
-            [frame[i : i + frame.cols] for i in range(0, len(frame), frame.cols)]
-        )
-        frame_min = frame.min()
-        frame_avg = frame.avg()
-        frame_med = frame.med()
-        frame_max = frame.max()
-
-        plt.clf()
-        im = plt.pcolormesh(heatmap, cmap="coolwarm")
-        plt.colorbar(im)
-        # Set title
-        plt.title(f"Heatmap {hex(dev.i2c_addr)}")
-        plt.xlabel(dev.name)
+        for dev, frame, frame_stats in latest.values():
+            heatmap = np.asarray(frame).reshape(frame.rows, frame.cols)
+            # Reuse the values calculated for the alert, only the median is new
+            frame_min, frame_avg, frame_max = frame_stats
+            frame_med = frame.med()
 
-        # Add text below graph
-        plt.text(
-            1,
-            1,
-            "\n".join(
-                [
-                    f"max: {frame_max:.2f}°C",
-                    f"avg: {frame_avg:.2f}°C",
-                    f"med: {frame_med:.2f}°C",
-                    f"min: {frame_min:.2f}°C",
-                ]
-            ),
-            color="white",
-            fontsize=10,
-            bbox=dict(facecolor="black", alpha=0.25, linewidth=0, boxstyle="round"),
-        )
+            im.set_data(_quantize(heatmap, frame_min, frame_max))
+            # Sets both limits at once, set_clim can leave the colorbar in between
+            cbar.norm.autoscale((frame_min, frame_max))
+            ax.set_title(f"Heatmap {dev.name}")
+            ax.set_xlabel(dev.name)
+            text.set_text(
+                f"max: {frame_max:.2f}°C\navg: {frame_avg:.2f}°C\n"
+                f"med: {frame_med:.2f}°C\nmin: {frame_min:.2f}°C"
+            )
 
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        filename = f"alerts/heatmap_{dev.name}_{timestamp}.png"
-        plt.savefig(filename, bbox_inches="tight")
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+            filename = f"alerts/heatmap_{dev.name}_{timestamp}.png"
+            canvas.draw()
+            writer_queue.put((filename, np.asarray(canvas.buffer_rgba()).copy()))
 
-    for thread in capture_threads:
-        thread.join()
+    capture_thread.join()
 
 
 def console_example(addresses: list[int]):
@@ -157,12 +244,15 @@ def console_example(addresses: list[int]):
         print("---")
         for dev in devs:
             frame = dev.capture(threshold=(-40, 300))
-            frame_avg = f"{frame.avg():>6.2f}" if frame else str(None).rjust(6)
-            frame_min = f"{frame.min():>6.2f}" if frame else str(None).rjust(6)
-            frame_max = f"{frame.max():>6.2f}" if frame else str(None).rjust(6)
+            if frame is None:
+                frame_avg = frame_min = frame_max = str(None).rjust(6)
+            else:
+                frame_min, frame_avg, frame_max = (
+                    f"{v:>6.2f}" for v in frame.min_avg_max()
+                )
 
             print(
-                f"Sensor with addr {hex(dev.i2c_addr)} on {dev.com:<5} has min: {frame_min}, avg: {frame_avg}, max: {frame_max}"
+                f"Sensor with addr {dev.name} on {dev.com:<5} has min: {frame_min}, avg: {frame_avg}, max: {frame_max}"
             )
 
         print("---")
@@ -176,9 +266,7 @@ def heatmaps():
 
     frames_buffer: dict[int, Frame] = {}
 
-    lock = threading.Lock()
     running = threading.Event()
-    capture_threads: list[threading.Thread] = []
 
     def alert_callback(alert: Alert, frame: Frame):
         print(
@@ -199,109 +287,180 @@ def heatmaps():
                 )
             )
 
-    def capture_frames(dev: MLX90640):
-        config = dev.config
-        crop = config["crop"]
+    def crop_settings(dev: MLX90640):
+        crop = dev.config["crop"]
         penalty = (
             crop["penalty"]
             if "penalty" in crop and crop["penalty"] is not None
             else 100
         )
-        capturer = _capture_frame(dev)
-        while not running.is_set():
-            frame = next(capturer)
-
-            x1 = crop.get("x1") or 0
-            y1 = crop.get("y1") or 0
-            x2 = crop.get("x2") or frame.cols
-            y2 = crop.get("y2") or frame.rows
-
-            # Check if cropping is auto
-            if ("col" in crop) and ("row" in crop):
-                x1, y1, x2, y2 = utils.find_hottest_spot(frame, penalty)
-
-            # print(f"Crop {hex(dev.i2c_addr)}: {x1=}, {y1=}, {x2=}, {y2=}\n", end="")
+        # Check if cropping is auto
+        auto_crop = ("col" in crop) and ("row" in crop)
+        fixed_coords = (
+            crop.get("x1") or 0,
+            crop.get("y1") or 0,
+            crop.get("x2") or FRAME_COLS,
+            crop.get("y2") or FRAME_ROWS,
+        )
+        return penalty, auto_crop, fixed_coords
 
-            frame = frame.crop(x1, y1, x2, y2)
-            with lock:
-                frames_buffer[dev.i2c_addr] = frame
+    def capture_frames():
+        settings = [
+            (dev, dev.config["threshold"], dev.config["outlier_threshold"])
+            for dev in devs
+        ]
+        crops = {dev.i2c_addr: crop_settings(dev) for dev in devs}
 
-    # Start a thread for each sensor
-    for dev in devs:
-        thread = threading.Thread(
-            target=capture_frames,
-            name=f"Captrure thread {hex(dev.i2c_addr)}",
-            args=(dev,),
-        )
-        thread.start()
-        capture_threads.append(thread)
+        while not running.is_set():
+            captured = False
+            # Each EVB buffers up to 4 frames, poll every device once per round
+            for dev, threshold, outlier_threshold in settings:
+                # An error of one sensor must not stop capturing the others
+                try:
+                    frame = dev.capture(
+                        attempts=1,
+                        threshold=threshold,
+                        outlier_threshold=outlier_threshold,
+                    )
+                    if frame is None:
+                        continue
+                    captured = True
+
+                    penalty, auto_crop, fixed_coords = crops[dev.i2c_addr]
+                    x1, y1, x2, y2 = (
+                        utils.find_hottest_spot(frame, penalty)
+                        if auto_crop
+                        else fixed_coords
+                    )
+
+                    # print(f"Crop {dev.name}: {x1=}, {y1=}, {x2=}, {y2=}\n", end="")
+
+                    frame = frame.crop(x1, y1, x2, y2)
+                    # Storing an item in a dict is atomic, no lock needed
+                    frames_buffer[dev.i2c_addr] = frame
+                except Exception as e:
+                    print(f"Failed to capture from {dev.name}: {e}")
+
+            if not captured:
+                # No EVB had a frame buffered
+                time.sleep(0.01)
+
+    # Start one thread that captures from all sensors
+    capture_thread = threading.Thread(target=capture_frames, name="Capture thread")
+    capture_thread.start()
 
     def on_close(event: Any):
         running.set()
 
     fig = plt.figure(num="Sensors")
     fig.canvas.mpl_connect("close_event", on_close)
-    # plt.ion()
-    while not running.is_set():
-        plt.clf()
 
-        with lock:
-            frames_buffer_copy = frames_buffer.copy()
+    # Build the axes and artists once, the artists are updated in place. They
+    # are animated so they are left out of the cached background and blitted.
+    axes: dict[int, Axes] = {}
+    images: dict[int, AxesImage] = {}
+    texts: dict[int, Text] = {}
+    colorbars: dict[int, Colorbar] = {}
+    for i, dev in enumerate(sorted(devs, key=lambda dev: dev.i2c_addr)):
+        key = dev.i2c_addr
+        ax = fig.add_subplot(2, 3, i + 1)
+        axes[key] = ax
+
+        # Placeholder until the first frame of this device is captured
+        images[key] = ax.imshow(
+            np.zeros((FRAME_ROWS, FRAME_COLS), dtype=np.uint8),
+            cmap="coolwarm",
+            vmin=0,
+            vmax=255,
+            interpolation="nearest",
+            origin="lower",
+            aspect="auto",
+            animated=True,
+        )
+        # The image is quantized, the colorbar shows the temperatures
+        colorbars[key] = fig.colorbar(ScalarMappable(cmap="coolwarm"), ax=ax)
+        colorbars[key].ax.set_animated(True)
 
-        for i, key in enumerate(sorted(frames_buffer_copy.keys())):
-            frame = frames_buffer_copy[key]
-            dev = [dev for dev in devs if dev.i2c_addr == key][0]
-            config = dev.config
+        # sns.heatmap(data=heatmap, cmap="coolwarm") # better but a lot slower
 
-            # show_surfaces(frame)
-            # continue
+        # Hide x-axis and y-axis
+        ax.get_xaxis().set_visible(False)
+        ax.get_yaxis().set_visible(False)
 
-            heatmap = np.array(
-                [frame[i : i + frame.cols] for i in range(0, len(frame), frame.cols)]
-            )
-            frame_min = frame.min()
-            frame_avg = frame.avg()
-            frame_med = frame.med()
-            frame_max = frame.max()
+        # Set title
+        ax.set_title(f"Heatmap {dev.name}")
 
-            ax = plt.subplot(2, 3, i + 1)
+        # Add text below graph
+        texts[key] = ax.text(
+            1,
+            1,
+            "",
+            color="white",
+            fontsize=10,
+            bbox=dict(facecolor="black", alpha=0.25, linewidth=0, boxstyle="round"),
+            animated=True,
+        )
 
-            im = plt.pcolormesh(heatmap, cmap="coolwarm")
-            fig.colorbar(im, ax=ax)
+    fig.tight_layout()  # Adjust spacing between subplots
 
-            # sns.heatmap(data=heatmap, cmap="coolwarm") # better but a lot slower
+    background: Any = None
+    drawn: set[int] = set()
 
-            # Hide x-axis and y-axis
-            ax.get_xaxis().set_visible(False)
-            ax.get_yaxis().set_visible(False)
+    def draw_animated():
+        for key in drawn:
+            axes[key].draw_artist(images[key])
+            axes[key].draw_artist(texts[key])
+            fig.draw_artist(colorbars[key].ax)
 
-            # Set title
-            plt.title(f"Heatmap {hex(dev.i2c_addr)}")
+    def on_draw(event: Any):
+        # Full redraws (first show, resizing the window, ...) renew the background
+        nonlocal background
+        # The interactive backends that support blitting all render with Agg
+        background = cast(FigureCanvasAgg, fig.canvas).copy_from_bbox(fig.bbox)
+        draw_animated()
 
-            # Add text below graph
-            ax.text(
-                1,
-                1,
-                "\n".join(
-                    [
-                        f"max: {frame_max:.2f}°C",
-                        f"avg: {frame_avg:.2f}°C",
-                        f"med: {frame_med:.2f}°C",
-                        f"min: {frame_min:.2f}°C",
-                    ]
-                ),
-                color="white",
-                fontsize=10,
-                bbox=dict(facecolor="black", alpha=0.25, linewidth=0, boxstyle="round"),
+    fig.canvas.mpl_connect("draw_event", on_draw)
+
+    # Show the plots
+    # plt.show(block=True)
+    plt.pause(0.1)
+
+    # plt.ion()
+    while not running.is_set():
+        # Atomic snapshot, the capture thread can keep storing frames
+        for key, frame in list(frames_buffer.items()):
+            # show_surfaces(frame)
+            # continue
+
+            heatmap = np.asarray(frame).reshape(frame.rows, frame.cols)
+            frame_min, frame_avg, frame_max, frame_med = frame.stats()
+
+            im = images[key]
+            # Auto cropping can change the size of the frame
+            resized = im.get_size() != heatmap.shape
+            im.set_data(_quantize(heatmap, frame_min, frame_max))
+            if resized:
+                im.set_extent((-0.5, frame.cols - 0.5, -0.5, frame.rows - 0.5))
+            # Sets both limits at once, set_clim can leave the colorbar in between
+            colorbars[key].norm.autoscale((frame_min, frame_max))
+
+            texts[key].set_text(
+                f"max: {frame_max:.2f}°C\navg: {frame_avg:.2f}°C\n"
+                f"med: {frame_med:.2f}°C\nmin: {frame_min:.2f}°C"
             )
+            drawn.add(key)
+
+        if background is None or not fig.canvas.supports_blit:
+            fig.canvas.draw_idle()
+        else:
+            # Only redraw the changed artists on top of the cached background
+            cast(FigureCanvasAgg, fig.canvas).restore_region(background)
+            draw_animated()
+            fig.canvas.blit(fig.bbox)
 
-        # Show the plots
-        plt.tight_layout()  # Adjust spacing between subplots
-        # plt.show(block=True)
-        plt.pause(0.1)
+        fig.canvas.start_event_loop(0.1)
 
-    for thread in capture_threads:
-        thread.join()
+    capture_thread.join()
 
 
 def show_surfaces(frame: Frame):
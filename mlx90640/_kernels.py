@@ -0,0 +1,236 @@
+"""
+_kernels.py - Compiled kernels for the per-frame hot paths.
+
+The kernels are compiled with numba on their first call. The compiled code is
+cached on disk, so later runs of the program don't have to compile them again.
+The kernels release the GIL while they run, so other Python threads, like the
+plotting loop next to the capture thread in the examples, are not held up.
+"""
+
+import numpy as np
+import numpy.typing as npt
+from numba import njit  # type: ignore
+
+
+@njit(cache=True, nogil=True, fastmath=True)  # type: ignore
+def replace_outliers(
+    values: npt.NDArray[np.float32],
+    threshold: float,
+    out: npt.NDArray[np.float32],
+) -> npt.NDArray[np.float32]:
+    """
+    Replaces outliers with the average value.
+
+    A value is an outlier when it differs `threshold` times the average,
+    or more, from the average.
+
+    Args:
+        values (npt.NDArray[np.float32]): One dimensional array of frame values.
+        threshold (float): Threshold for identifying outliers.
+        out (npt.NDArray[np.float32]): Array to write the result to, may be `values` itself.
+
+    Returns:
+        npt.NDArray[np.float32]: `out`, with the outliers replaced.
+    """
+    total = 0.0
+    for i in range(values.size):
+        total += values[i]
+    average = total / values.size
+
+    limit = threshold * average
+    for i in range(values.size):
+        value = values[i]
+        out[i] = average if abs(value - average) >= limit else value
+    return out
+
+
+@njit(cache=True, nogil=True, fastmath=True)  # type: ignore
+def min_avg_max(values: npt.NDArray[np.float32]) -> tuple[float, float, float]:
+    """
+    Calculates the minimum, average and maximum value in a single pass.
+
+    Args:
+        values (npt.NDArray[np.float32]): Two dimensional array of frame values.
+
+    Returns:
+        tuple[float, float, float]: The minimum, average and maximum value.
+    """
+    rows, cols = values.shape
+    minimum = maximum = values[0, 0]
+    total = 0.0
+    for r in range(rows):
+        for c in range(cols):
+            value = values[r, c]
+            total += value
+            if value < minimum:
+                minimum = value
+            elif value > maximum:
+                maximum = value
+    return minimum, total / values.size, maximum
+
+
+@njit(cache=True, nogil=True)  # type: ignore
+def best_surface(
+    values: npt.NDArray[np.float64], edges: npt.NDArray[np.int64]
+) -> tuple[int, int]:
+    """
+    Finds the surface with the highest average value.
+
+    A surface only counts when its average is higher than the lowest value in
+    `values`, otherwise the empty surface `(0, 0)` is returned.
+
+    Args:
+        values (npt.NDArray[np.float64]): One dimensional array of values.
+        edges (npt.NDArray[np.int64]): Edges of the surfaces in `values`.
+
+    Returns:
+        tuple[int, int]: Start and end index of the surface.
+    """
+    best = values.min()
+    start, end = 0, 0
+    for k in range(edges.size - 1):
+        a, b = edges[k], edges[k + 1]
+        total = 0.0
+        for i in range(a, b):
+            total += values[i]
+        average = total / (b - a)
+        if average > best:
+            best = average
+            start, end = a, b
+    return start, end
+
+
+@njit(cache=True, nogil=True)  # type: ignore
+def _pelt_l2(
+    signal: npt.NDArray[np.float64],
+    penalty: float,
+    jump: int,
+    min_size: int,
+    out: npt.NDArray[np.int64],
+) -> int:
+    """
+    Detects change points in a signal with PELT and the l2 cost.
+
+    This follows `ruptures.Pelt` step by step, including the admissible points
+    on the jump grid and the pruning rule, so it finds the same change points.
+
+    Args:
+        signal (npt.NDArray[np.float64]): One dimensional signal.
+        penalty (float): Penalty parameter for change point detection.
+        jump (int): Only consider change points on multiples of `jump`.
+        min_size (int): Minimum length of a segment.
+        out (npt.NDArray[np.int64]): Array to write the edges to, starting with 0.
+
+    Returns:
+        int: Number of edges written to `out`.
+    """
+    n = signal.size
+
+    # Prefix sums of the signal and its squares, so the l2 cost of a segment
+    # takes constant time
+    s1 = np.zeros(n + 1)
+    s2 = np.zeros(n + 1)
+    for i in range(n):
+        s1[i + 1] = s1[i] + signal[i]
+        s2[i + 1] = s2[i] + signal[i] * signal[i]
+
+    total_cost = np.zeros(n + 1)
+    previous = np.zeros(n + 1, dtype=np.int64)
+    known = np.zeros(n + 1, dtype=np.bool_)
+    known[0] = True
+
+    admissible = np.empty(n + 1, dtype=np.int64)
+    sums = np.empty(n + 1)
+    n_admissible = 0
+
+    first = (min_size + jump - 1) // jump * jump
+    for bkp in list(range(first, n, jump)) + [n]:
+        admissible[n_admissible] = (bkp - min_size) // jump * jump
+        n_admissible += 1
+
+        best, best_t, n_sums = np.inf, 0, 0
+        for j in range(n_admissible):
+            t = admissible[j]
+            if not known[t]:
+                continue
+            segment_sum = s1[bkp] - s1[t]
+            cost = s2[bkp] - s2[t] - segment_sum * segment_sum / (bkp - t)
+            total = total_cost[t] + (cost + penalty)
+            sums[n_sums] = total
+            n_sums += 1
+            if total < best:
+                best, best_t = total, t
+        total_cost[bkp] = best
+        previous[bkp] = best_t
+        known[bkp] = True
+
+        # Like ruptures, pair the admissible points with the partitions that
+        # were found, skipped points shift the pairing.
+        kept = 0
+        for j in range(n_sums):
+            if sums[j] <= best + penalty:
+                admissible[kept] = admissible[j]
+                kept += 1
+        n_admissible = kept
+
+    count = 1
+    bkp = n
+    while bkp != 0:
+        count += 1
+        bkp = previous[bkp]
+    bkp = n
+    for i in range(count - 1, -1, -1):
+        out[i] = bkp
+        bkp = previous[bkp]
+    return count
+
+
+@njit(cache=True, nogil=True)  # type: ignore
+def pelt_l2_batch(
+    signals: npt.NDArray[np.float64], penalty: float, jump: int, min_size: int
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """
+    Detects change points in each row of `signals`, see `_pelt_l2`.
+
+    Args:
+        signals (npt.NDArray[np.float64]): Two dimensional array with a signal per row.
+        penalty (float): Penalty parameter for change point detection.
+        jump (int): Only consider change points on multiples of `jump`.
+        min_size (int): Minimum length of a segment.
+
+    Returns:
+        tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]: The edges of every signal, padded with
+        zeros, and the number of edges of every signal.
+    """
+    n_signals, n = signals.shape
+    edges = np.zeros((n_signals, n + 1), dtype=np.int64)
+    counts = np.zeros(n_signals, dtype=np.int64)
+    for r in range(n_signals):
+        counts[r] = _pelt_l2(signals[r], penalty, jump, min_size, edges[r])
+    return edges, counts
+
+
+@njit(cache=True, nogil=True)  # type: ignore
+def best_surfaces(
+    signals: npt.NDArray[np.float64],
+    edges: npt.NDArray[np.int64],
+    counts: npt.NDArray[np.int64],
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """
+    Finds the surface with the highest average value in each row of `signals`.
+
+    Args:
+        signals (npt.NDArray[np.float64]): Two dimensional array with a signal per row.
+        edges (npt.NDArray[np.int64]): The edges of every signal, see `pelt_l2_batch`.
+        counts (npt.NDArray[np.int64]): The number of edges of every signal.
+
+    Returns:
+        tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]: Start and end index of the surface of
+        every signal.
+    """
+    n_signals = signals.shape[0]
+    starts = np.zeros(n_signals, dtype=np.int64)
+    ends = np.zeros(n_signals, dtype=np.int64)
+    for r in range(n_signals):
+        starts[r], ends[r] = best_surface(signals[r], edges[r, : counts[r]])
+    return starts, ends
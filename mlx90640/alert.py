@@ -1,5 +1,8 @@
 from typing import Any, Callable, TypedDict, Literal
 
+import numpy as np
+import numpy.typing as npt
+
 from .frame import Frame, FrameValue
 
 # "Alert" refers to Alert class, not a string
@@ -130,20 +133,26 @@ class Alert:
             bool: True if the alert should be triggered, False otherwise.
         """
 
-        avg = frame.avg()
+        values = np.asarray(frame)
+
+        avg = float(values.mean())
         if self.avg_value is not None and (
             self.avg_value[0] > avg or avg > self.avg_value[1]
         ):
             self._last_trigger = {"offender": "avg", "value": avg}
             return True
 
-        for value in frame:
-            if self._eval_min(value):
-                self._last_trigger = {"offender": "min", "value": value}
-                return True
-            elif self._eval_max(value):
-                self._last_trigger = {"offender": "max", "value": value}
-                return True
+        below_min = self._eval_min(values)
+        above_max = self._eval_max(values)
+        offending = below_min | above_max
+        if offending.any():
+            # The first offending value triggers the alert, min before max
+            index = int(offending.argmax())
+            self._last_trigger = {
+                "offender": "min" if below_min[index] else "max",
+                "value": float(values[index]),
+            }
+            return True
 
         if self.condition_callback and self.condition_callback():
             self._last_trigger["offender"] = "cb"
@@ -154,46 +163,46 @@ class Alert:
     @staticmethod
     def _eval(
         test: Threshold | float | None,
-        value: FrameValue,
-        cb: Callable[[float, FrameValue], bool],
-    ) -> bool:
+        values: npt.NDArray[np.float32],
+        cb: Callable[[float, npt.NDArray[np.float32]], npt.NDArray[np.bool_]],
+    ) -> npt.NDArray[np.bool_]:
         """
-        Evaluate a condition based on the given test value and frame value.
+        Evaluate a condition based on the given test value for each frame value.
 
         Args:
             test (Union[Threshold, float, None]): The test value or threshold.
-            value (FrameValue): The frame value to evaluate.
-            cb (Callable[[float, float], bool]): A callback function for custom evaluation.
+            values (npt.NDArray[np.float32]): The frame values to evaluate.
+            cb (Callable[[float, npt.NDArray[np.float32]], npt.NDArray[np.bool_]]): A callback function for custom evaluation.
 
         Returns:
-            bool: True if the condition is met, False otherwise.
+            npt.NDArray[np.bool_]: Boolean mask, True where the condition is met.
         """
         if test is None:
-            return True
+            return np.ones(values.shape, dtype=bool)
         elif isinstance(test, tuple):
-            return test[0] <= value < test[1]
-        return cb(test, value)
+            return (test[0] <= values) & (values < test[1])
+        return cb(test, values)
 
-    def _eval_min(self, value: FrameValue) -> bool:
+    def _eval_min(self, values: npt.NDArray[np.float32]) -> npt.NDArray[np.bool_]:
         """
-        Evaluate whether the given value satisfies the minimum threshold condition.
+        Evaluate which of the given values violate the minimum threshold condition.
 
         Args:
-            value (FrameValue): The frame value to evaluate.
+            values (npt.NDArray[np.float32]): The frame values to evaluate.
 
         Returns:
-            bool: True if the value exceeds the minimum threshold, False otherwise.
+            npt.NDArray[np.bool_]: Boolean mask, True where the value is below the minimum threshold.
         """
-        return not Alert._eval(self.min_value, value, lambda test, value: value > test)
+        return ~Alert._eval(self.min_value, values, lambda test, values: values > test)
 
-    def _eval_max(self, value: FrameValue) -> bool:
+    def _eval_max(self, values: npt.NDArray[np.float32]) -> npt.NDArray[np.bool_]:
         """
-        Evaluate whether the given value satisfies the maximum threshold condition.
+        Evaluate which of the given values violate the maximum threshold condition.
 
         Args:
-            value (FrameValue): The frame value to evaluate.
+            values (npt.NDArray[np.float32]): The frame values to evaluate.
 
         Returns:
-            bool: True if the value is above the maximum threshold, False otherwise.
+            npt.NDArray[np.bool_]: Boolean mask, True where the value is above the maximum threshold.
         """
-        return not Alert._eval(self.max_value, value, lambda test, value: value < test)
+        return ~Alert._eval(self.max_value, values, lambda test, values: values < test)
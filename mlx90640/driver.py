@@ -1,8 +1,9 @@
-import time
+import numpy as np
 import serial
 import mlx.mlx90640 as mlx
 from mlx.hw_usb_evb90640 import HwUsbEvb90640, USB_PID, USB_VID
 
+from ._kernels import replace_outliers
 from .alert import Alert
 from .frame import Frame
 from . import utils
@@ -19,6 +20,10 @@ class MLX90640:
 
     Config = utils.Config
 
+    _name: str
+    _config: tuple[utils.Config, utils.Sensor] | None = None
+    """The loaded config with the sensor config looked up in it."""
+
     sensors: list["MLX90640"] = []
     """List of sensors"""
 
@@ -48,6 +53,7 @@ class MLX90640:
 
         self.temp_offset = temp_offset
         self.alerts = []
+        self._name = hex(i2c_addr)
 
         # add self to sensor list
         MLX90640.sensors.append(self)
@@ -55,7 +61,7 @@ class MLX90640:
     @property
     def name(self) -> str:
         """Name of the device. The hexadecimal notation of its i2c address."""
-        return hex(self.i2c_addr)
+        return self._name
 
     @property
     def com(self) -> str:
@@ -76,8 +82,14 @@ class MLX90640:
     def config(self) -> utils.Sensor:
         """The config for this device from the config file.
 
+        The lookup is cached on the instance, and done again when the config
+        file is reloaded because it changed.
+
         *These values are not automatically stored in the MLX90640 instance."""
-        return MLX90640.get_config(self.i2c_addr)
+        config = MLX90640.load_config()
+        if self._config is None or self._config[0] is not config:
+            self._config = (config, MLX90640.get_config(self.i2c_addr))
+        return self._config[1]
 
     @staticmethod
     def discover(i2c_addr: int) -> str | None:
@@ -164,24 +176,23 @@ class MLX90640:
                 if frame is None:
                     continue
                 # calculates the temperatures for each pixel
-                compensated = Frame(self.dev.do_compensation(frame, add_ambient_temperature=False))  # type: ignore
+                temps = np.array(self.dev.do_compensation(frame, add_ambient_temperature=False), dtype=np.float32)  # type: ignore
 
-                no_outliers = compensated.replace_outliers_with_average(
-                    threshold=outlier_threshold,
-                )
+                # Replace the outliers with the average, same as Frame.replace_outliers_with_average
+                replace_outliers(temps, outlier_threshold, temps)
 
-                final_frame = Frame([temp + self.temp_offset for temp in no_outliers])
+                temps += self.temp_offset
 
-                if all(min_temp <= temp <= max_temp for temp in final_frame):
+                # Only frames within the threshold are turned into a Frame
+                if temps.min() >= min_temp and temps.max() <= max_temp:
+                    # The frame takes the float32 buffer over without a copy
+                    final_frame = Frame(temps, copy=False)
                     # Handle registered alerts
                     self._handle_alerts(final_frame)
                     # Return the final frame
                     return final_frame
             except Exception:
                 self.dev.clear_error(FRAME_RATE)
-
-            # Small delay between frame reads
-            time.sleep(0.01)
         # Frame failed to capture
         return None
 
@@ -2,28 +2,57 @@
 frame.py - Module for handling MLX90640 captured frames.
 
 This module defines the `Frame` class, which represents a captured frame of the MLX90640 sensor.
-The frame class inherits from list[float], meaning you can interpret an instance of 
-this class as a simple list of floats
+The frame values are stored in a single contiguous float32 numpy array. A frame can still
+be iterated, indexed and measured with `len` like a simple list of floats, and it can be
+passed to numpy directly without copying.
 """
 
+import threading
 import numpy as np
+import numpy.typing as npt
 import ruptures as rpt
 
-from typing import Any, overload, Iterable, Generator
+from typing import Any, cast, overload, Iterable, Iterator, Generator
+
+from ._kernels import best_surface, replace_outliers
+from ._kernels import min_avg_max as _min_avg_max
 
 FrameValue = float
 
 FRAME_COLS = 32
 FRAME_ROWS = 24
 
+EDGES_JUMP = 5
+"""Default jump of the change point detection, change points are multiples of it."""
+EDGES_MIN_SIZE = 2
+"""Minimum length of a surface in the change point detection, the ruptures default."""
+
+
+_detectors = threading.local()
+"""Change point detectors of the current thread, by model and jump."""
+
+
+def _get_detector(model: str, jump: int) -> rpt.Pelt:
+    """
+    Get the change point detector for a model and jump, creating it on first use.
 
-def avg(lst: list[float]) -> float:
-    return sum(lst) / len(lst)
+    A fitted detector holds on to the signal it was fitted on. Every thread gets
+    its own detectors, so a caller on another thread can't fit a shared detector
+    between another thread's fit and predict.
+    """
+    cache: dict[tuple[str, int], rpt.Pelt] = _detectors.__dict__.setdefault("cache", {})
+    key = (model, jump)
+    if key not in cache:
+        cache[key] = rpt.Pelt(model, min_size=EDGES_MIN_SIZE, jump=jump)
+    return cache[key]
 
 
-class Frame(list[FrameValue]):
+class Frame:
     """Representation of a captured frame of the MLX90640"""
 
+    _arr: npt.NDArray[np.float32]
+    """The frame values, a float32 array with shape `(rows, cols)`."""
+
     cols: int
     rows: int
 
@@ -32,6 +61,8 @@ class Frame(list[FrameValue]):
         iterable: Iterable[FrameValue],
         cols: int = FRAME_COLS,
         rows: int = FRAME_ROWS,
+        *,
+        copy: bool = True,
     ) -> None:
         """
         Initialize a Frame object.
@@ -40,18 +71,74 @@ class Frame(list[FrameValue]):
             iterable (Iterable[FrameValue]): An iterable of frame values.
             cols (int, optional): Number of columns (default: 32).
             rows (int, optional): Number of rows (default: 24).
+            copy (bool, optional): Copy the values (default: True). When False, a float32
+                array is used as is, and shares its memory with the frame.
 
         Raises:
             ValueError: If the dimensions of the object do not match the expected size.
         """
         self.cols = cols
         self.rows = rows
-        super().__init__(iterable)
+        if isinstance(iterable, Iterator):
+            iterable = list(iterable)
+        if copy:
+            values = np.array(iterable, dtype=np.float32)
+        else:
+            values = np.asarray(iterable, dtype=np.float32)
 
-        if len(self) != self.cols * self.rows:
+        if values.size != self.cols * self.rows:
             raise ValueError(
                 "The dimensions of the object do not match the expected size."
             )
+        self._arr = values.reshape(self.rows, self.cols)
+
+    def __len__(self) -> int:
+        return self._arr.size
+
+    def __iter__(self) -> Iterator[FrameValue]:
+        return iter(self._arr.ravel().tolist())
+
+    @overload
+    def __getitem__(self, index: int) -> FrameValue: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> npt.NDArray[np.float32]: ...
+
+    def __getitem__(self, index: int | slice) -> FrameValue | npt.NDArray[np.float32]:
+        """
+        Get a value, or a view of a slice of the values.
+
+        Returns:
+            FrameValue | npt.NDArray[np.float32]: The value at `index`, or a read-only array when
+                `index` is a slice. The array is a view, except for cropped frames.
+        """
+        if isinstance(index, slice):
+            view = self._arr.ravel()[index]
+            view.flags.writeable = False
+            return view
+
+        # Index the rows and columns directly, flattening a cropped frame copies it
+        size = self._arr.size
+        position = index + size if index < 0 else index
+        if not (0 <= position < size):
+            raise IndexError(
+                f"Frame index out of range. Received {index}, size is {size}"
+            )
+        return float(self._arr[divmod(position, self.cols)])
+
+    def __array__(self, dtype: Any = None) -> npt.NDArray[Any]:
+        """
+        Expose the frame values to numpy.
+
+        `np.asarray(frame)` does not copy, except for cropped frames. Their values
+        are not contiguous in memory, so they are copied into a flat array. The
+        returned array is read-only, frames are not meant to be modified in place.
+        """
+        view = self._arr.reshape(-1)
+        view.flags.writeable = False
+        if dtype is None:
+            return view
+        return view.astype(dtype, copy=False)
 
     @property
     def is_modified(self):
@@ -63,35 +150,40 @@ class Frame(list[FrameValue]):
         """
         return self.cols != FRAME_COLS or self.rows != FRAME_ROWS
 
-    def iterate_cols(self) -> Generator[list[FrameValue], Any, None]:
+    def iterate_cols(self) -> Generator[npt.NDArray[np.float32], Any, None]:
         """
         Generator function to iterate over each column in the frame.
 
         Yields:
-            list[FrameValue]: A column from the frame.
+            npt.NDArray[np.float32]: A read-only view of a column from the frame.
         """
-        for col in range(self.cols):
-            yield self.get_col(col)
+        cols = self._arr.T.view()
+        cols.flags.writeable = False
+        yield from cols
 
-    def iterate_rows(self) -> Generator[list[FrameValue], Any, None]:
+    def iterate_rows(self) -> Generator[npt.NDArray[np.float32], Any, None]:
         """
         Generator function to iterate over each row in the frame.
 
         Yields:
-            list[FrameValue]: A row from the frame.
+            npt.NDArray[np.float32]: A read-only view of a row from the frame.
         """
-        for row in range(self.rows):
-            yield self.get_row(row)
+        rows = self._arr.view()
+        rows.flags.writeable = False
+        yield from rows
 
     @staticmethod
     def get_surfaces_edges(
-        sequence: list[FrameValue], penalty: int, jump: int = 5, model: str = "l2"
+        sequence: list[FrameValue] | npt.NDArray[np.floating[Any]],
+        penalty: int,
+        jump: int = EDGES_JUMP,
+        model: str = "l2",
     ) -> list[int]:
         """
         Detect change points in a sequence of frame values.
 
         Args:
-            sequence (list[FrameValue]): A list of frame values.
+            sequence (list[FrameValue] | npt.NDArray[np.floating[Any]]): A list or array of frame values.
             penalty (int): Penalty parameter for change point detection.
             jump (int, optional): Jump parameter (default: 5).
             model (str, optional): Change point detection model (default: "l2").
@@ -99,48 +191,72 @@ class Frame(list[FrameValue]):
         Returns:
             list[int]: List of detected change points.
         """
-        # Create a signal (time series)
-        signal = np.array(sequence).reshape(-1, 1)
+        # Create a signal (time series), float64 arrays are used as they are
+        signal = np.asarray(sequence, dtype=np.float64).reshape(-1, 1)
 
-        # Initialize the change point detector
-        algo = rpt.Pelt(model, jump=jump).fit(signal)
+        # Fit the change point detector
+        algo = _get_detector(model, jump).fit(signal)
 
         # Detect change points
-        result: list[int] = algo.predict(penalty)
+        result = cast(list[int], algo.predict(pen=penalty))
 
         return [0, *result]
 
     @staticmethod
     def get_surfaces(
-        sequence: list[FrameValue], edges: list[int]
+        sequence: list[FrameValue] | npt.NDArray[np.floating[Any]], edges: list[int]
     ) -> tuple[int, int, list[FrameValue]]:
         """Get the surface with the highest average value in a given sequence."""
-        surfaces = []
-        highest = [min(sequence)]
-        start, end = 0, 0
-        for i in range(len(edges) - 1):
-            surface = sequence[edges[i] : edges[i + 1]]
-            surfaces.append(surface)
-            if avg(surface) > avg(highest):
-                highest = surface
-                start, end = edges[i], edges[i + 1]
-
-        return start, end, highest
+        values = np.asarray(sequence, dtype=np.float64)
+        start, end = best_surface(values, np.asarray(edges, dtype=np.int64))
+        if start == end:
+            return start, end, [float(values.min())]
+        return start, end, values[start:end].tolist()
 
     def min(self) -> FrameValue:
-        return min(self)
+        return float(self._arr.min())
 
     def avg(self) -> float:
-        return avg(self)
+        return float(self._arr.mean())
 
     def med(self) -> float:
-        """Calculates the median value of a list of floats."""
-        s = sorted(self)
-        n = len(s)
-        return (s[n // 2] + s[(n - 1) // 2]) / 2 if n % 2 == 0 else s[n // 2]
+        """Calculates the median value of the frame."""
+        return float(np.median(self._arr))
 
     def max(self) -> FrameValue:
-        return max(self)
+        return float(self._arr.max())
+
+    def min_avg_max(self) -> tuple[FrameValue, float, FrameValue]:
+        """
+        Calculates the minimum, average and maximum value of the frame.
+
+        The values are calculated together in a single pass over the frame, which
+        is faster than calling each method on its own.
+
+        Returns:
+            tuple[FrameValue, float, FrameValue]: The minimum, average and maximum value.
+
+        Raises:
+            ValueError: If the frame is empty.
+        """
+        # The kernel doesn't check the size, it would read outside an empty frame
+        if self._arr.size == 0:
+            raise ValueError("Can't calculate the values of an empty frame.")
+        minimum, average, maximum = _min_avg_max(self._arr)
+        return float(minimum), float(average), float(maximum)
+
+    def stats(self) -> tuple[FrameValue, float, FrameValue, float]:
+        """
+        Calculates the minimum, average, maximum and median value of the frame.
+
+        Use `min_avg_max` when the median isn't needed, the median takes a
+        separate and more expensive pass over the frame.
+
+        Returns:
+            tuple[FrameValue, float, FrameValue, float]: The minimum, average, maximum
+                and median value.
+        """
+        return *self.min_avg_max(), self.med()
 
     def replace_outliers_with_average(self, threshold: float = 2) -> "Frame":
         """
@@ -150,14 +266,12 @@ class Frame(list[FrameValue]):
             threshold (float): Threshold for identifying outliers (default: 2).
 
         Returns:
-            list: A new list with outliers replaced.
+            Frame: A new frame with outliers replaced.
         """
-        # Calculate the average of non-outlier values
-        frame_avg = self.avg()
-        non_outliers = [
-            x if abs(x - frame_avg) < threshold * frame_avg else frame_avg for x in self
-        ]
-        return Frame(non_outliers)
+        values = np.empty(self._arr.size, dtype=np.float32)
+        replace_outliers(self._arr.ravel(), threshold, values)
+        # The new frame takes the buffer over, it isn't used anywhere else
+        return Frame(values, self.cols, self.rows, copy=False)
 
     @overload
     def crop(self, coords1: tuple[int, int], coords2: tuple[int, int]) -> "Frame": ...
@@ -169,7 +283,7 @@ class Frame(list[FrameValue]):
         """
         Crops a frame.
 
-        Frame needs to be unmodified. (24x32)
+        The cropped frame is a view, it shares its values with this frame.
 
         Returns:
             Frame: A new cropped frame.
@@ -183,14 +297,15 @@ class Frame(list[FrameValue]):
             x1, y1, x2, y2 = args
 
         x1 = max(0, x1)
-        x2 = min(FRAME_COLS, x2)
+        x2 = min(self.cols, x2)
         y1 = max(0, y1)
-        y2 = min(FRAME_ROWS, y2)
+        y2 = min(self.rows, y2)
 
         return Frame(
-            [self[(i * 32) + j] for i in range(y1, y2) for j in range(x1, x2)],
+            self._arr[y1:y2, x1:x2],
             x2 - x1,
             y2 - y1,
+            copy=False,
         )
 
     def get_index(self, row: int, col: int) -> int:
@@ -208,13 +323,13 @@ class Frame(list[FrameValue]):
         Raises:
             IndexError: If either the row or column index is out of bounds.
         """
-        if not (0 <= row <= self.rows):
+        if not (0 <= row < self.rows):
             raise IndexError(
-                f"Row index out of bounds. Received {row}, max is {self.rows}"
+                f"Row index out of bounds. Received {row}, max is {self.rows - 1}"
             )
-        elif not (0 <= col <= self.cols):
+        elif not (0 <= col < self.cols):
             raise IndexError(
-                f"Column index out of bounds. Received {col}, max is {self.cols}"
+                f"Column index out of bounds. Received {col}, max is {self.cols - 1}"
             )
         return row * self.cols + col
 
@@ -228,7 +343,9 @@ class Frame(list[FrameValue]):
         Returns:
             list[FrameValue]: List of frame values in the specified row.
         """
-        return [self[self.get_index(row, col)] for col in range(self.cols)]
+        # Raises an IndexError when the row is out of bounds
+        self.get_index(row, 0)
+        return self._arr[row].tolist()
 
     def get_col(self, col: int) -> list[FrameValue]:
         """
@@ -240,4 +357,6 @@ class Frame(list[FrameValue]):
         Returns:
             list[FrameValue]: List of frame values in the specified column.
         """
-        return [self[self.get_index(row, col)] for row in range(self.rows)]
+        # Raises an IndexError when the column is out of bounds
+        self.get_index(0, col)
+        return self._arr[:, col].tolist()
@@ -1,7 +1,11 @@
+import os
 import json
+import numpy as np
+import numpy.typing as npt
 from typing import Iterable, TypedDict
 
-from .frame import Frame
+from .frame import EDGES_JUMP, EDGES_MIN_SIZE, Frame
+from ._kernels import best_surfaces, pelt_l2_batch
 
 
 class Crop(TypedDict):
@@ -39,7 +43,12 @@ class Sensor(DefaultSensor):
     addr: int
     """I2C address of the sensor."""
     attempts: int
-    """Times the program will attempt to read a valid frame"""
+    """
+    Times the program will attempt to read a valid frame
+    
+    The examples ignore this value, they poll the sensors round-robin with a
+    single attempt each, so one sensor can't hold up the others.
+    """
     crop: Crop | AutoCrop
     """How the program has to crop the frame"""
     offset: float
@@ -69,26 +78,44 @@ class Config(TypedDict):
     """List of sensors"""
 
 
-_config: Config | None = None
+_configs: dict[str, tuple[int, Config]] = {}
 """
-Private variable to store the loaded config.
+Private variable to store the loaded configs, by absolute path.
 
-This prevents to many read operations to the config file.
+Each config is stored with the modification time of its file. This prevents
+to many read operations to the config file.
 """
 
 
+def _to_threshold(
+    value: list[float] | tuple[float, float] | float | None,
+) -> tuple[float, float] | float | None:
+    """
+    Convert a threshold from the config file to a tuple of floats or a float.
+
+    JSON has no tuples, so a threshold `[min, max]` is read as a list.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return float(value[0]), float(value[1])
+    return float(value)
+
+
 def load_config(path: str) -> Config:
     """
     Load the config file from specified path.
 
-    Config will be cached in memory. So the same config will be
-    returned each time. Even if another path is specified the
-    second time you call this method.
+    Config will be cached in memory per path. So the same config will be
+    returned each time, until the file is modified.
     """
-    global _config
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+
     # Return cached config
-    if _config:
-        return _config
+    cached = _configs.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
 
     # Read config from file
     with open(path, "r", encoding="utf-8") as file:
@@ -102,10 +129,10 @@ def load_config(path: str) -> Config:
 
     config["default"].setdefault("crop", {"x1": 0, "y1": 0, "x2": 32, "y2": 24})
 
-    # Convert threshold list to tuple[int, int]
+    # Convert threshold list to tuple[float, float]
     config["default"]["threshold"] = (
-        config["default"]["threshold"][0],
-        config["default"]["threshold"][1],
+        float(config["default"]["threshold"][0]),
+        float(config["default"]["threshold"][1]),
     )
 
     # Add None values for missing keys
@@ -117,48 +144,81 @@ def load_config(path: str) -> Config:
         sensor.setdefault("outlier_threshold", config["default"]["outlier_threshold"])
         sensor.setdefault("alerts", config["default"]["alerts"])
 
+        # Convert the values once, so they don't have to be converted for every frame
+        sensor["threshold"] = (
+            float(sensor["threshold"][0]),
+            float(sensor["threshold"][1]),
+        )
+        sensor["outlier_threshold"] = float(sensor["outlier_threshold"])
+
         for alert in sensor["alerts"]:
-            alert.setdefault("min", None)
-            alert.setdefault("avg", None)
-            alert.setdefault("max", None)
+            alert["min"] = _to_threshold(alert.get("min"))
+            alert["avg"] = _to_threshold(alert.get("avg"))  # type: ignore
+            alert["max"] = _to_threshold(alert.get("max"))
             alert.setdefault("name", None)
 
     # Cache config
-    _config = config
+    _configs[path] = (mtime, config)
     return config
 
 
 def calculate_best_coords_to_crop(
-    sequences: Iterable[list[float]],
+    sequences: (
+        Iterable[list[float] | npt.NDArray[np.float32]] | npt.NDArray[np.float32]
+    ),
     penalty: int,
 ) -> tuple[int, int]:
     """
     Calculates the best coordinates for cropping based on sequences of values.
 
     Args:
-        sequences (Iterable[list[float]]): An iterable of sequences (lists) of float values.
+        sequences (Iterable[list[float] | npt.NDArray[np.float32]] | npt.NDArray[np.float32]): An
+            iterable of sequences (lists or arrays) of float values, or a two dimensional array with
+            a sequence per row. Sequences of the same length are processed in a single batch.
         penalty (int): A penalty value.
 
     Returns:
         tuple[int, int]: A tuple containing the best x-coordinate (min value) and the best y-coordinate (max value).
+
+    Raises:
+        ValueError: If a sequence is shorter than the minimum surface size.
     """
-    # Initialize variables to keep track of the best values and their indices
-    best_value1 = []
-    best_value2 = []
-
-    # Iterate through the sequences
-    for seq in sequences:
-        edges = Frame.get_surfaces_edges(seq, penalty=penalty)
-        value1, value2, _ = Frame.get_surfaces(seq, edges)
-        if value1 != 0:
-            best_value1.append(value1)
-        if value2 != 32:
-            best_value2.append(value2)
-
-    return min(
-        best_value1 if best_value1 else [0],
-    ), max(
-        best_value2 if best_value2 else [32],
+    if isinstance(sequences, np.ndarray):
+        batches = [sequences.astype(np.float64)]
+    else:
+        rows = [np.asarray(seq, dtype=np.float64) for seq in sequences]
+        if not rows:
+            return 0, 32
+        if len({row.size for row in rows}) == 1:
+            batches = [np.array(rows, dtype=np.float64)]
+        else:
+            # Sequences of different lengths can't be stacked, detect them one by one
+            batches = [row.reshape(1, -1) for row in rows]
+    if all(len(batch) == 0 for batch in batches):
+        return 0, 32
+
+    # The kernel doesn't check this, ruptures would raise on these sequences
+    if any(batch.shape[1] < EDGES_MIN_SIZE for batch in batches if len(batch)):
+        raise ValueError(
+            f"Sequences need at least {EDGES_MIN_SIZE} values to detect surfaces."
+        )
+
+    # Detect the change points of all sequences at once, with the same
+    # parameters as `Frame.get_surfaces_edges`
+    results = [
+        best_surfaces(
+            batch, *pelt_l2_batch(batch, float(penalty), EDGES_JUMP, EDGES_MIN_SIZE)
+        )
+        for batch in batches
+    ]
+    starts = np.concatenate([result[0] for result in results])
+    ends = np.concatenate([result[1] for result in results])
+
+    starts = starts[starts != 0]
+    ends = ends[ends != 32]
+    return (
+        int(starts.min()) if starts.size else 0,
+        int(ends.max()) if ends.size else 32,
     )
 
 
@@ -173,8 +233,7 @@ def find_hottest_spot(frame: Frame, penalty: int) -> tuple[int, int, int, int]:
     Returns:
         tuple[int, int, int, int]: A tuple containing the x1, y1, x2, and y2 coordinates of the hottest spot.
     """
-    x1, x2 = calculate_best_coords_to_crop(frame.iterate_rows(), penalty)
-    y1, y2 = calculate_best_coords_to_crop(
-        (frame.get_col(i) for i in range(x1, x2)), penalty
-    )
+    values = np.asarray(frame).reshape(frame.rows, frame.cols)
+    x1, x2 = calculate_best_coords_to_crop(values, penalty)
+    y1, y2 = calculate_best_coords_to_crop(values[:, x1:x2].T, penalty)
     return x1, y1, x2, y2